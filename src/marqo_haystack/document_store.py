@@ -1,15 +1,356 @@
+import base64
+import inspect
+import json
 import logging
-from typing import Any, Dict, List, Optional, Union
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from operator import itemgetter
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
 
 import marqo
+import numpy as np
 from haystack.preview.dataclasses import Document
 from haystack.preview.document_stores.decorator import document_store
 from haystack.preview.document_stores.protocols import DuplicatePolicy
+from marqo.errors import MarqoCloudIndexNotFoundError, MarqoWebError
+from marqo.index import Index
+from marqo.models.search_models import BulkSearchBody
 
 from marqo_haystack.errors import MarqoDocumentStoreFilterError
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional dependency, the standard library json module is used without it
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# HTTP status code of a Marqo response for an index or endpoint that doesn't exist
+_NOT_FOUND_STATUS = 404
+# HTTP status codes returned by Marqo servers that predate the bulk search endpoint
+_BULK_SEARCH_UNSUPPORTED_STATUS = frozenset({_NOT_FOUND_STATUS, 405})
+# arguments of Index.search that the store sets itself and that can't be passed as search parameters
+_RESERVED_SEARCH_PARAMS = frozenset({"q", "limit", "offset", "filter_string", "show_highlights", "highlights"})
+
+
+def _bulk_search_params() -> Dict[str, str]:
+    """
+    Map the parameters of Index.search that a bulk search query accepts to their name in the query. The names are
+    matched against the fields of the client's BulkSearchBody model, ignoring underscores and case.
+    """
+    body_fields = {name.replace("_", "").lower(): name for name in BulkSearchBody.__fields__}
+    params = {}
+    for name in inspect.signature(Index.search).parameters:
+        field = body_fields.get(name.replace("_", "").lower())
+        if field is not None and name not in _RESERVED_SEARCH_PARAMS:
+            params[name] = field
+    return params
+
+
+_BULK_SEARCH_PARAMS = _bulk_search_params()
+
+_LOGICAL_OPS = frozenset({"$and", "$or", "$not"})
+# document fields that are stored at the top level of a marqo document, everything else is metadata
+_DIRECT_KEYS = frozenset({"id", "text", "mime_type", "metadata", "id_hash_keys", "score", "embedding"})
+_NUMERIC_TYPES = (int, float)
+
+# metadata fields are flattened into the marqo document with this prefix
+_METADATA_PREFIX = "__metadata_"
+_METADATA_PREFIX_LEN = len(_METADATA_PREFIX)
+
+# marqo caps limit + offset of a search at 10,000 by default (MARQO_MAX_RETRIEVABLE_DOCS)
+_MAX_FILTER_RESULTS = 10_000
+_FILTER_PAGE_SIZE = 1_000
+
+# seconds the index stats are reused for by count_documents and count_vectors
+_STATS_TTL = 1.0
+
+# marqo clients by (url, api_key), shared by all stores
+_CLIENT_CACHE: Dict[Tuple[str, Optional[str]], marqo.Client] = {}
+_CLIENT_CACHE_LOCK = threading.Lock()
+
+# large get_documents_by_id calls are split into chunks of this size and fetched concurrently, the executor is
+# shared by all stores so its threads are only started once
+_GET_DOCUMENTS_CHUNK_SIZE = 128
+_GET_DOCUMENTS_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="marqo-get-documents")
+
+
+class _OrjsonModule:
+    """
+    Stand-in for the json module in marqo's HTTP layer that serialises request bodies with orjson.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(json, name)
+
+    @staticmethod
+    def dumps(obj: Any, **kwargs) -> Union[str, bytes]:
+        if kwargs:
+            return json.dumps(obj, **kwargs)
+        try:
+            # bytes are sent as they are, a str with non-ASCII characters would be encoded as latin-1 by http.client
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # orjson is stricter than json, e.g. about non-string keys, so fall back for anything it rejects
+            return json.dumps(obj)
+
+
+def _response_to_json(response: Any) -> Any:
+    if response.content == b"":
+        return response
+    return orjson.loads(response.content)
+
+
+def _get_client(url: str, api_key: Optional[str]) -> marqo.Client:
+    """
+    Get the marqo client shared by all stores using the same Marqo instance and credentials. The client holds no
+    per-store state, the stores already use it from several threads for concurrent uploads and searches.
+    """
+    key = (url, api_key)
+    with _CLIENT_CACHE_LOCK:
+        client = _CLIENT_CACHE.get(key)
+        if client is None:
+            client = _CLIENT_CACHE[key] = marqo.Client(url=url, api_key=api_key)
+    return client
+
+
+def _use_orjson_for_marqo_requests() -> None:
+    """
+    Make the marqo client (de)serialise its HTTP payloads with orjson, which is several times faster than json on
+    large add_documents bodies and search responses. Does nothing if orjson is not installed or if the marqo client
+    internals are not the ones expected.
+    """
+    if orjson is None:
+        return
+
+    try:
+        from marqo import _httprequests
+    except ImportError:
+        return
+
+    if getattr(_httprequests, "json", None) is json:
+        _httprequests.json = _OrjsonModule()
+
+    http_requests = getattr(_httprequests, "HttpRequests", None)
+    if http_requests is not None and hasattr(http_requests, "_HttpRequests__to_json"):
+        http_requests._HttpRequests__to_json = staticmethod(_response_to_json)
+
+
+_use_orjson_for_marqo_requests()
+
+
+def _doc_key(key: str) -> str:
+    """
+    The name of the marqo document field a haystack filter key refers to
+    """
+    if key in _DIRECT_KEYS:
+        return key
+    return _METADATA_PREFIX + key
+
+
+def _emit_eq(doc_key: str, value: Any) -> str:
+    return f"{doc_key}:({value})"
+
+
+def _emit_ne(doc_key: str, value: Any) -> str:
+    return f"NOT {doc_key}:({value})"
+
+
+def _emit_in(doc_key: str, value: List[Any]) -> str:
+    return f"({' OR '.join(f'{doc_key}:({v})' for v in value)})"
+
+
+def _emit_nin(doc_key: str, value: List[Any]) -> str:
+    return f"({' AND '.join(f'NOT {doc_key}:{v}' for v in value)})"
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, _NUMERIC_TYPES) and not isinstance(value, bool)
+
+
+def _check_numeric(value: Any) -> None:
+    if not _is_number(value):
+        msg = f"Filter value {value} of type {type(value)} is not supported for range filters, must be of type int or float"
+        raise MarqoDocumentStoreFilterError(msg)
+
+
+def _require_numeric(emit: Callable[[str, Any], str]) -> Callable[[str, Any], str]:
+    """
+    Reject range filter values that are not numbers before they reach the emitter.
+    """
+
+    @wraps(emit)
+    def emit_numeric(doc_key: str, value: Any) -> str:
+        _check_numeric(value)
+        return emit(doc_key, value)
+
+    return emit_numeric
+
+
+# marqo doesn't have an exclusing range so we use a magic number
+def _exclusive_lower_bound(value: Any) -> Any:
+    return value + value * 1e-16
+
+
+def _exclusive_upper_bound(value: Any) -> Any:
+    return value - value * 1e-16
+
+
+@_require_numeric
+def _emit_gt(doc_key: str, value: Any) -> str:
+    return f"{doc_key}:[{_exclusive_lower_bound(value)} TO *]"
+
+
+@_require_numeric
+def _emit_gte(doc_key: str, value: Any) -> str:
+    return f"{doc_key}:[{value} TO *]"
+
+
+@_require_numeric
+def _emit_lt(doc_key: str, value: Any) -> str:
+    return f"{doc_key}:[* TO {_exclusive_upper_bound(value)}]"
+
+
+@_require_numeric
+def _emit_lte(doc_key: str, value: Any) -> str:
+    return f"{doc_key}:[* TO {value}]"
+
+
+# comparison operators mapped to the function building their marqo filter string
+_COMPARISON_OPERATORS: Dict[str, Callable[[str, Any], str]] = {
+    "$eq": _emit_eq,
+    "$ne": _emit_ne,
+    "$in": _emit_in,
+    "$nin": _emit_nin,
+    "$gt": _emit_gt,
+    "$gte": _emit_gte,
+    "$lt": _emit_lt,
+    "$lte": _emit_lte,
+}
+
+
+def _pack_dense_vector(vector: Any) -> str:
+    """
+    Encode a vector as base64 little-endian float32 bytes, about a quarter of the size of a JSON list of floats.
+    """
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode()
+
+
+def _unpack_dense_vector(packed: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(packed), dtype="<f4")
+
+
+def _prepare_document(d: Document, *, pack_embeddings: bool = False) -> Dict[str, Any]:
+    """
+    Change the document in a way we can better store it into Marqo.
+    """
+    document = {"_id": d.id, "id": d.id, "text": d.text, "mime_type": d.mime_type}
+    for k, v in d.metadata.items():
+        document[_METADATA_PREFIX + k] = v
+    if pack_embeddings and d.embedding is not None:
+        document["embedding"] = _pack_dense_vector(d.embedding)
+        document["embedding_encoding"] = "base64"
+    return document
+
+
+class _LRUCache:
+    """
+    A minimal thread-safe least recently used cache, a maxsize of 0 disables caching. Entries expire `ttl` seconds
+    after they were put if a ttl is given.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def _is_search_param(name: str) -> bool:
+    """
+    Check whether a search parameter can be passed to Index.search by the installed marqo client.
+    """
+    if name in _RESERVED_SEARCH_PARAMS:
+        return False
+    parameters = inspect.signature(Index.search).parameters
+    return name in parameters or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters.values())
+
+
+def _check_search_params(search_params: Optional[Dict[str, Any]]) -> None:
+    """
+    Raise a ValueError for search parameters the document store sets itself or the marqo client doesn't accept,
+    before they reach Index.search as an unexpected keyword argument.
+    """
+    for name in search_params or ():
+        if not _is_search_param(name):
+            msg = f"Search parameter {name} is set by MarqoDocumentStore or not supported by the installed Marqo client"
+            raise ValueError(msg)
+
+
+def _search_params_key(search_params: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Hashable form of search parameters, for the query cache.
+    """
+    if not search_params:
+        return None
+    return json.dumps(search_params, sort_keys=True)
+
+
+def _convert_one(
+    marqo_doc: Dict[str, Any],
+    *,
+    with_score: bool = True,
+    prefix: str = _METADATA_PREFIX,
+    prefix_len: int = _METADATA_PREFIX_LEN,
+) -> Document:
+    """
+    Convert a single Marqo document into a Haystack Document. The metadata prefix is bound as default arguments so
+    the hot loop over the document's fields only reads fast locals.
+    """
+    metadata = {k[prefix_len:]: v for k, v in marqo_doc.items() if k.startswith(prefix)}
+
+    embedding = None
+    if marqo_doc.get("embedding_encoding") == "base64":
+        embedding = _unpack_dense_vector(marqo_doc["embedding"])
+
+    return Document(
+        id=marqo_doc["_id"],
+        text=marqo_doc["text"],
+        metadata=metadata,
+        mime_type=marqo_doc.get("mime_type"),
+        score=marqo_doc.get("_score") if with_score else None,
+        embedding=embedding,
+    )
+
 
 @document_store
 class MarqoDocumentStore:
@@ -24,6 +365,11 @@ class MarqoDocumentStore:
         api_key: Optional[str] = None,
         settings_dict: Optional[Dict[str, Any]] = None,
         client_batch_size: int = 4,
+        num_workers: int = 1,
+        query_cache_size: int = 0,
+        query_cache_ttl: Optional[float] = 300,
+        *,
+        pack_embeddings: bool = False,
     ):
         """Initialise the document store
 
@@ -33,41 +379,91 @@ class MarqoDocumentStore:
             api_key (Optional[str], optional): Your Marqo Cloud API key (only required for cloud). Defaults to None.
             settings_dict (Optional[Dict[str, Any]], optional): A settings dictionary for creation of the index if running Marqo locally. Defaults to None.
             client_batch_size (int, optional): The client batch size for adding documents, set this higher (16-32) if using a GPU. Defaults to 4.
+            num_workers (int, optional): The number of threads used to upload documents concurrently, set this higher
+                (4-8) if your Marqo server can handle concurrent requests. Defaults to 1.
+            query_cache_size (int, optional): The number of search results kept in memory for repeated text queries. The
+                cache is cleared whenever this store writes or deletes documents, but writes made by other clients are
+                only seen once a cached result expires. Defaults to 0, which disables the cache.
+            query_cache_ttl (Optional[float], optional): The number of seconds a cached search result is used for, this
+                bounds how long writes to the index made by other clients can go unnoticed. None keeps results until
+                this store writes or deletes documents. Defaults to 300.
+            pack_embeddings (bool, optional): Store document embeddings as base64 encoded float32 bytes so they are
+                returned with the documents, if False embeddings are not stored. Marqo keeps them as an ordinary text
+                field that is indexed for lexical search and filtering, about 4 KB per document for 768 dimensions.
+                Defaults to False.
 
         Raises:
             ValueError: If collection_name is not an existing index and you are using Marqo cloud then an error will be raised.
         """
 
-        self._marqo_client = marqo.Client(url=url, api_key=api_key)
+        self._marqo_client = _get_client(url, api_key)
 
         self._collection = collection_name
 
-        indexes = {idx.index_name for idx in self._marqo_client.get_indexes()["results"]}
-        if self._collection not in indexes:
-            if not api_key:
+        if not api_key:
+            # creating the index straight away saves a round-trip compared to listing the indexes first
+            try:
                 self._marqo_client.create_index(self._collection, settings_dict=settings_dict)
-            else:
-                raise ValueError(
-                    "If using this integration with Marqo Cloud you must create your index ahead of time, specify your index name as the collection_name in the MarqoDocumentStore constructor."
-                )
-        else:
-            print(f"Index {self._collection} already exists, skipping index creation.")
+            except MarqoWebError as e:
+                if "already exists" not in str(e):
+                    raise
+                logger.debug(f"Index {self._collection} already exists, skipping index creation.")
+        elif not self._index_exists():
+            msg = "If using this integration with Marqo Cloud you must create your index ahead of time, specify your index name as the collection_name in the MarqoDocumentStore constructor."
+            raise ValueError(msg)
 
         self._index = self._marqo_client.index(self._collection)
 
         self.client_batch_size = client_batch_size
+        self.num_workers = num_workers
+        self.pack_embeddings = pack_embeddings
+
+        self._bulk_search_supported = hasattr(self._marqo_client, "bulk_search")
+        self._query_cache = _LRUCache(query_cache_size, ttl=query_cache_ttl)
+        self._stats_cache: Tuple[float, Optional[Dict[str, Any]]] = (0.0, None)
+
+    def _index_exists(self) -> bool:
+        """
+        Check whether the index exists by asking Marqo for its stats, which doesn't depend on the number of indexes
+        like listing them does. Listing is only used if the stats can't tell.
+        """
+        try:
+            self._marqo_client.index(self._collection).get_stats()
+        except MarqoCloudIndexNotFoundError:
+            # raised by the client itself when its cached list of Marqo Cloud index URLs has no entry for the index,
+            # which may be out of date for an index that was just created
+            logger.debug(f"Marqo Cloud has no URL for index {self._collection}, listing the indexes instead.")
+        except MarqoWebError as e:
+            if e.status_code == _NOT_FOUND_STATUS:
+                return False
+            logger.debug(f"Could not get the stats of index {self._collection} ({e}), listing the indexes instead.")
+        else:
+            return True
+        return self._collection in {idx.index_name for idx in self._marqo_client.get_indexes()["results"]}
 
     def count_documents(self) -> int:
         """
         Returns how many documents are present in the document store.
         """
-        return self._index.get_stats()["numberOfDocuments"]
+        return self._get_stats()["numberOfDocuments"]
 
     def count_vectors(self) -> int:
         """
         Returns how many vectors are present in the document store.
         """
-        return self._index.get_stats()["numberOfVectors"]
+        return self._get_stats()["numberOfVectors"]
+
+    def _get_stats(self) -> Dict[str, Any]:
+        """
+        Get the index stats, reusing them for back-to-back calls within `_STATS_TTL` seconds. The cached stats are
+        dropped whenever this store writes or deletes documents.
+        """
+        fetched_at, stats = self._stats_cache
+        now = time.monotonic()
+        if stats is None or now - fetched_at >= _STATS_TTL:
+            stats = self._index.get_stats()
+            self._stats_cache = (now, stats)
+        return stats
 
     def filter_documents(self, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
         """Returns at most 10,000 documents that match the filter
@@ -87,29 +483,23 @@ class MarqoDocumentStore:
             raise MarqoDocumentStoreFilterError(msg)
 
         filter_string = self._convert_filters(filters)
-        results = self._index.search("", filter_string=filter_string, limit=10000)
-        hits = []
-        for r in results["hits"]:
-            r.pop("_score")
-            hits.append(r)
+        hits = self._scroll_documents(filter_string)
+        return list(self._get_result_to_documents(hits, with_score=False))
 
-        return self._get_result_to_documents(hits)
-
-    def _escape_special_filter(self, filter_value: Union[str, List[str]]) -> Union[str, List[str]]:
+    def _scroll_documents(self, filter_string: Optional[str] = None) -> List[Dict[str, Any]]:
         """
-        Escape special characters in filter values
+        Get the documents matching the filter string, or all documents in the index, up to Marqo's maximum number of
+        retrievable results. Marqo has no endpoint to list documents, so this searches an empty query. A first small
+        page covers the common case of few matches, if it comes back full everything is fetched in one more search:
+        paging with offsets would redo the approximate search for every page and could skip or repeat hits at the
+        page boundaries.
         """
-        special_chars = {"+", "-", "&&", "||", "!", "(", ")", "{", "}", "[", "]", "^", '"', "~", "*", "?", ":", "\\"}
-        if isinstance(filter_value, list):
-            return [self._escape_special_filter(v) for v in filter_value]
-
-        if not isinstance(filter_value, str):
-            return filter_value
-
-        if any(c in filter_value for c in special_chars):
-            for c in special_chars:
-                filter_value = filter_value.replace(c, f"\\{c}")
-        return filter_value
+        search = partial(self._index.search, "", filter_string=filter_string, show_highlights=False)
+        hits = search(limit=_FILTER_PAGE_SIZE)["hits"]
+        if len(hits) == _FILTER_PAGE_SIZE:
+            hits = search(limit=_MAX_FILTER_RESULTS)["hits"]
+        # an approximate search shouldn't return a document twice, but the documents are returned once either way
+        return list({hit["_id"]: hit for hit in hits}.values())
 
     def _convert_filters(self, filters: Optional[Dict[str, Any]] = None, boolean_op: str = "AND") -> str:
         """
@@ -119,22 +509,69 @@ class MarqoDocumentStore:
         if not filters:
             return None
 
-        filter_statements = []
+        # a single field compared to a literal, the most common filter, needs none of the machinery below
+        if isinstance(filters, dict) and len(filters) == 1:
+            ((k, v),) = filters.items()
+            if k not in _LOGICAL_OPS and not isinstance(v, (dict, list)):
+                return _emit_eq(_doc_key(k), v)
+
+        return self._compile_filters(filters, boolean_op)
+
+    @staticmethod
+    def _compile_filters(filters: Union[Dict[str, Any], List[Dict[str, Any]]], boolean_op: str) -> str:
+        """
+        Build the marqo filter string for non-empty haystack filters
+        """
+        # walk the filters with an explicit stack instead of recursing. A frame holds the remaining statements of a
+        # group, the separator between them, the token closing the group and whether a statement was written yet;
+        # statements, separators and parentheses go straight into the one token buffer that is joined at the end
+        tokens: List[str] = []
+        stack: List[List[Any]] = [[iter(MarqoDocumentStore._filter_statements(filters)), f" {boolean_op} ", "", False]]
+        while stack:
+            frame = stack[-1]
+            statement = next(frame[0], None)
+            if statement is None:
+                stack.pop()
+                if frame[2]:
+                    tokens.append(frame[2])
+                continue
+
+            if frame[3]:
+                tokens.append(frame[1])
+            frame[3] = True
+
+            if isinstance(statement, str):
+                tokens.append(statement)
+                continue
+
+            group, op, parenthesise = statement
+            if parenthesise:
+                tokens.append("(")
+            statements = iter(MarqoDocumentStore._filter_statements(group))
+            stack.append([statements, f" {op} ", ")" if parenthesise else "", False])
+
+        return "".join(tokens)
+
+    @staticmethod
+    def _filter_statements(filters: Union[Dict[str, Any], List[Dict[str, Any]]]) -> List[Any]:
+        """
+        Split one level of haystack filters into statements. A statement is either a finished filter string or a
+        (filters, boolean_op, parenthesise) group that still needs to be converted.
+        """
+        if not filters:
+            msg = "Empty filters are not supported with MarqoDocumentStore"
+            raise MarqoDocumentStoreFilterError(msg)
 
         if isinstance(filters, list):
-            for f in filters:
-                filter_statements.append(self._convert_filters(f))
-            return f" {boolean_op} ".join(filter_statements)
+            return [(f, "AND", False) for f in filters]
 
+        statements: List[Any] = []
         for k in filters:
-            if k in {"$and", "$or", "$not"}:
-                filter_statements.append(f"({self._convert_filters(filters[k], k[1:].upper())})")
+            if k in _LOGICAL_OPS:
+                statements.append((filters[k], k[1:].upper(), True))
                 continue
 
-            if k in {"id", "text", "mime_type", "metadata", "id_hash_keys", "score", "embedding"}:
-                doc_key = k
-            else:
-                doc_key = "__metadata_" + k
+            doc_key = _doc_key(k)
 
             # get the child of the filter for the key
             child = filters[k]
@@ -143,79 +580,43 @@ class MarqoDocumentStore:
             if isinstance(child, dict):
                 for op in child:
                     # if logical operator
-                    if op in {"$and", "$or", "$not"}:
-                        if isinstance(child[op], list):
-                            new_op = {}
-                            for v in child[op]:
-                                new_op |= v
-                            child[op] = new_op
-                        filter_statements.append(f"({self._convert_filters({k: child[op]}, op[1:].upper())})")
+                    if op in _LOGICAL_OPS:
+                        conditions = child[op]
+                        # the conditions of a field's logical operator may be given as a list, merged into one
+                        # dict without modifying the caller's filters
+                        if isinstance(conditions, list):
+                            merged: Dict[str, Any] = {}
+                            for c in conditions:
+                                merged.update(c)
+                            conditions = merged
+                        statements.append(({k: conditions}, op[1:].upper(), True))
                         continue
 
-                    value = child[op]
-
-                    # if comparison operator
-                    if op == "$eq":
-                        filt = f"{doc_key}:({value})"
-                    elif op == "$ne":
-                        filt = f"NOT {doc_key}:({value})"
-                    elif op == "$in":
-                        filts = []
-                        for v in value:
-                            filts.append(f"{doc_key}:({v})")
-                        filt = f"({' OR '.join(filts)})"
-                    elif op == "$nin":
-                        filts = []
-                        for v in value:
-                            filts.append(f"NOT {doc_key}:{v}")
-                        filt = f"({' AND '.join(filts)})"
-                    elif op == "$gt":
-                        # marqo doesn't have an exclusing range so we use a magic number
-                        if type(value) not in {int, float}:
-                            msg = f"Filter value {value} of type {type(value)} is not supported for range filters, must be of type int or float"
-                            raise MarqoDocumentStoreFilterError(msg)
-                        filt = f"{doc_key}:[{value + value*1e-16} TO *]"
-                    elif op == "$gte":
-                        if type(value) not in {int, float}:
-                            msg = f"Filter value {value} of type {type(value)} is not supported for range filters, must be of type int or float"
-                            raise MarqoDocumentStoreFilterError(msg)
-                        filt = f"{doc_key}:[{value} TO *]"
-                    elif op == "$lt":
-                        if type(value) not in {int, float}:
-                            msg = f"Filter value {value} of type {type(value)} is not supported for range filters, must be of type int or float"
-                            raise MarqoDocumentStoreFilterError(msg)
-                        # marqo doesn't have an exclusing range so we use a magic number
-                        filt = f"{doc_key}:[* TO {value - value*1e-16}]"
-                    elif op == "$lte":
-                        if type(value) not in {int, float}:
-                            msg = f"Filter value {value} of type {type(value)} is not supported for range filters, must be of type int or float"
-                            raise MarqoDocumentStoreFilterError(msg)
-                        filt = f"{doc_key}:[* TO {value}]"
-                    else:
+                    emit = _COMPARISON_OPERATORS.get(op)
+                    if emit is None:
                         msg = f"Operator {op} is not supported with MarqoDocumentStore or is not a valid operator"
                         raise MarqoDocumentStoreFilterError(msg)
-                    filter_statements.append(filt)
-                    continue
+                    statements.append(emit(doc_key, child[op]))
             # if the child is a list then we apply the implict OR
             elif isinstance(child, list):
-                filts = []
-                for v in child:
-                    filts.append(f"{doc_key}:({v})")
-                filt = f"({' OR '.join(filts)})"
-                filter_statements.append(filt)
+                statements.append(_emit_in(doc_key, child))
             # otherwise the child is a literal value
             else:
-                filter_statements.append(f"{doc_key}:({child})")
+                statements.append(_emit_eq(doc_key, child))
 
-        return f" {boolean_op} ".join(filter_statements)
+        return statements
 
     def get_documents_by_id(self, ids: List[str]) -> List[Document]:
         """
         Returns documents with given ids.
         """
-        results = self._index.get_documents(document_ids=ids)["results"]
-        results = [r for r in results if r["_found"]]
-        return self._get_result_to_documents(results)
+        if len(ids) <= _GET_DOCUMENTS_CHUNK_SIZE:
+            results = self._index.get_documents(document_ids=ids)["results"]
+        else:
+            chunks = [ids[i : i + _GET_DOCUMENTS_CHUNK_SIZE] for i in range(0, len(ids), _GET_DOCUMENTS_CHUNK_SIZE)]
+            responses = _GET_DOCUMENTS_EXECUTOR.map(lambda chunk: self._index.get_documents(document_ids=chunk), chunks)
+            results = [r for response in responses for r in response["results"]]
+        return list(self._get_result_to_documents(filter(itemgetter("_found"), results)))
 
     def write_documents(self, documents: List[Document], policy: DuplicatePolicy = DuplicatePolicy.FAIL) -> None:
         """Writes documents into the Marqo index.
@@ -231,22 +632,49 @@ class MarqoDocumentStore:
             msg = "Documents must be a list"
             raise ValueError(msg)
 
-        marqo_docs = []
-        for d in documents:
-            if not isinstance(d, Document):
-                msg = "Documents must be of type Document"
-                raise ValueError(msg)
-            d = self._prepare_document(d)
-
-            if d["text"] is None:
-                logger.warn(
-                    f"Document {d['_id']} has no text, "
-                    "therefor Marqo has nothing to create an embedding for. This document will be skipped"
-                )
-                continue
+        if not all(isinstance(d, Document) for d in documents):
+            msg = "Documents must be of type Document"
+            raise ValueError(msg)
+
+        marqo_docs = [
+            _prepare_document(d, pack_embeddings=self.pack_embeddings) for d in documents if self._has_text(d)
+        ]
+
+        try:
+            if self.num_workers <= 1 or len(marqo_docs) <= self.client_batch_size:
+                self._add_documents(marqo_docs)
+                return
+
+            # uploading is bound by the network and by inference on the server, so threads overlap the requests
+            shard_size = -(-len(marqo_docs) // self.num_workers)
+            shards = [marqo_docs[i : i + shard_size] for i in range(0, len(marqo_docs), shard_size)]
+            with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+                # consuming the results re-raises the first exception from any shard
+                list(executor.map(self._add_documents, shards))
+        finally:
+            # cleared once the upload is done, a search running during the upload would otherwise cache stale results,
+            # and also if it failed since part of the documents may have been written
+            self._query_cache.clear()
+            self._stats_cache = (0.0, None)
+
+    @staticmethod
+    def _has_text(d: Document) -> bool:
+        """
+        Check that a document has text for Marqo to create an embedding for, documents without text are skipped.
+        """
+        if d.text is None:
+            logger.warn(
+                f"Document {d.id} has no text, "
+                "therefor Marqo has nothing to create an embedding for. This document will be skipped"
+            )
+            return False
 
-            marqo_docs.append(d)
+        return True
 
+    def _add_documents(self, marqo_docs: List[Dict[str, Any]]) -> None:
+        """
+        Upload already prepared documents to the Marqo index.
+        """
         self._index.add_documents(
             documents=marqo_docs, client_batch_size=self.client_batch_size, tensor_fields=["text"]
         )
@@ -258,9 +686,15 @@ class MarqoDocumentStore:
             document_ids (List[str]): A list of document IDs to delete.
         """
         self._index.delete_documents(ids=document_ids)
+        self._query_cache.clear()
+        self._stats_cache = (0.0, None)
 
     def search(
-        self, queries: List[Union[str, Dict[str, float]]], top_k: int, filters: Optional[Dict[str, Any]] = None
+        self,
+        queries: List[Union[str, Dict[str, float]]],
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
     ) -> List[List[Document]]:
         """Perform a search for a list of queries.
 
@@ -268,62 +702,137 @@ class MarqoDocumentStore:
             queries (List[Union[str, Dict[str, float]]]): A list of queries.
             top_k (int): The number of results to return.
             filters (Optional[Dict[str, Any]], optional): Filters to apply during search. Defaults to None.
+            search_params (Optional[Dict[str, Any]], optional): Extra keyword arguments for the Marqo search, for
+                example `search_method` or `searchable_attributes`. Defaults to None.
 
         Returns:
             List[List[Document]]: A list of matching documents for each query.
-        """
-        results = []
-        for query in queries:
-            result = self._index.search(q=query, limit=top_k, filter_string=self._convert_filters(filters))
-            results.append(result)
 
-        return self._query_result_to_documents(results)
+        Raises:
+            ValueError: If a search parameter is set by the document store or not accepted by the Marqo client.
+        """
+        return self._search_filter_string(queries, top_k, self._convert_filters(filters), search_params)
 
-    def _prepare_document(self, d: Document) -> Dict[str, Any]:
+    def _search_filter_string(
+        self,
+        queries: List[Union[str, Dict[str, float]]],
+        top_k: int,
+        filter_string: Optional[str],
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Document]]:
         """
-        Change the document in a way we can better store it into Marqo.
+        Search like `search` with filters that were already converted to a Marqo filter string.
         """
-        marqo_doc_meta = {}
+        _check_search_params(search_params)
+        if not queries:
+            return []
+
+        params_key = _search_params_key(search_params)
+
+        # weighted dictionary queries are unhashable so only text queries are cached
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        misses = []
+        for i, query in enumerate(queries):
+            if isinstance(query, str):
+                results[i] = self._query_cache.get((query, top_k, filter_string, params_key))
+            if results[i] is None:
+                misses.append(i)
+
+        if misses:
+            fetched = self._search([queries[i] for i in misses], top_k, filter_string, search_params)
+            for i, result in zip(misses, fetched):
+                results[i] = result
+                if isinstance(queries[i], str):
+                    self._query_cache.put((queries[i], top_k, filter_string, params_key), result)
 
-        for k in d.metadata:
-            new_k = "__metadata_" + k
-            marqo_doc_meta[new_k] = d.metadata[k]
+        return self._query_result_to_documents(results)
 
-        document = {
-            "_id": d.id,
-            "id": d.id,
-            "text": d.text,
-            "mime_type": d.mime_type,
-        }
+    def _search_one(
+        self,
+        query: Union[str, Dict[str, float]],
+        top_k: int,
+        filter_string: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        """
+        Search for a single query with a converted filter string, returning its documents without the list of lists
+        built by `search`.
+        """
+        _check_search_params(search_params)
+        cache_key = None
+        if isinstance(query, str):
+            cache_key = (query, top_k, filter_string, _search_params_key(search_params))
+        result = None if cache_key is None else self._query_cache.get(cache_key)
+        if result is None:
+            result = self._search([query], top_k, filter_string, search_params)[0]
+            if cache_key is not None:
+                self._query_cache.put(cache_key, result)
+
+        return list(self._get_result_to_documents(result["hits"]))
+
+    def _search(
+        self,
+        queries: List[Union[str, Dict[str, float]]],
+        top_k: int,
+        filter_string: Optional[str],
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search Marqo for every query, using a single bulk request for several queries when the server supports it.
+        """
+        search_params = search_params or {}
 
-        document |= marqo_doc_meta
-        return document
+        def search_one(query: Union[str, Dict[str, float]]) -> Dict[str, Any]:
+            # highlights are not part of the returned documents, so don't have Marqo compute and send them
+            return self._index.search(
+                q=query, limit=top_k, filter_string=filter_string, show_highlights=False, **search_params
+            )
 
-    def _get_result_to_documents(self, marqo_documents: List[Dict[str, Any]]) -> List[Document]:
+        # a single query gains nothing from the bulk endpoint's batching
+        if len(queries) == 1:
+            return [search_one(queries[0])]
+
+        # parameters the bulk endpoint doesn't know are only sent with single searches
+        if self._bulk_search_supported and all(name in _BULK_SEARCH_PARAMS for name in search_params):
+            try:
+                return self._bulk_search(queries, top_k, filter_string, search_params)
+            except MarqoWebError as e:
+                if e.status_code not in _BULK_SEARCH_UNSUPPORTED_STATUS:
+                    raise
+                logger.info("Bulk search is not supported by this Marqo server, falling back to one search per query.")
+                self._bulk_search_supported = False
+
+        # the searches are network bound, so run them concurrently to overlap the round trips
+        with ThreadPoolExecutor(max_workers=min(32, len(queries))) as executor:
+            return list(executor.map(search_one, queries))
+
+    def _bulk_search(
+        self,
+        queries: List[Union[str, Dict[str, float]]],
+        top_k: int,
+        filter_string: Optional[str],
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
         """
-        Helper function to convert Marqo results into Haystack Documents
+        Run all queries in a single request so Marqo can batch the inference and the searches.
         """
-        documents = []
-        for marqo_doc in marqo_documents:
-            # prepare metadata
-            metadata: Dict[str, Any] = {}
-            for k in marqo_doc:
-                if k.startswith("__metadata_"):
-                    new_k = k.replace("__metadata_", "")
-                    metadata[new_k] = marqo_doc[k]
-
-            mime_type = marqo_doc.get("mime_type")
-            document = Document(
-                id=marqo_doc["_id"],
-                text=marqo_doc["text"],
-                metadata=metadata,
-                mime_type=mime_type,
-                score=marqo_doc.get("_score"),
-            )
+        bulk_params = {_BULK_SEARCH_PARAMS[name]: value for name, value in (search_params or {}).items()}
+        bulk_queries = []
+        for query in queries:
+            bulk_query = {"index": self._collection, "q": query, "limit": top_k, "showHighlights": False, **bulk_params}
+            if filter_string is not None:
+                bulk_query["filter"] = filter_string
+            bulk_queries.append(bulk_query)
 
-            documents.append(document)
+        return self._marqo_client.bulk_search(bulk_queries)["result"]
 
-        return documents
+    def _get_result_to_documents(
+        self, marqo_documents: Iterable[Dict[str, Any]], *, with_score: bool = True
+    ) -> Iterator[Document]:
+        """
+        Helper function to lazily convert Marqo results into Haystack Documents
+        """
+        return map(partial(_convert_one, with_score=with_score), marqo_documents)
 
     def _query_result_to_documents(self, result: Dict[str, Any]) -> List[List[Document]]:
         """
@@ -332,6 +841,6 @@ class MarqoDocumentStore:
         retrievals = []
 
         for r in result:
-            converted_hits = self._get_result_to_documents(r["hits"])
+            converted_hits = list(self._get_result_to_documents(r["hits"]))
             retrievals.append(converted_hits)
         return retrievals
@@ -1,15 +1,61 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
 from haystack.preview import Document, component
+
 from marqo_haystack import MarqoDocumentStore
 
 
+def _deduplicate(queries: List[Any]) -> Tuple[List[Any], List[int]]:
+    """
+    Split queries into the distinct queries, in order of first occurrence, and the position of every query in them.
+    Weighted dictionary queries are unhashable and always kept.
+    """
+    unique_queries: List[Any] = []
+    positions: List[int] = []
+    first_positions: Dict[str, int] = {}
+    for query in queries:
+        if isinstance(query, str):
+            position = first_positions.get(query)
+            if position is None:
+                position = first_positions[query] = len(unique_queries)
+                unique_queries.append(query)
+        else:
+            position = len(unique_queries)
+            unique_queries.append(query)
+        positions.append(position)
+    return unique_queries, positions
+
+
 @component
 class MarqoRetriever:
     """
     A component for retrieving documents from an MarqoDocumentStore with multiple queries.
     """
 
-    def __init__(self, document_store: MarqoDocumentStore, filters: Optional[Dict[str, Any]] = None, top_k: int = 10):
+    # retrievers are created per pipeline and run often, slots keep them small and their attributes quick to read
+    __slots__ = (
+        "filters",
+        "top_k",
+        "document_store",
+        "max_workers",
+        "search_params",
+        "_filters_cache",
+        "_pool",
+        "__weakref__",
+    )
+
+    def __init__(
+        self,
+        document_store: MarqoDocumentStore,
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: int = 10,
+        max_workers: Optional[int] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ):
         """Create an retriever component. Usually you pass some basic configuration
         parameters to the constructor.
 
@@ -17,42 +63,170 @@ class MarqoRetriever:
             document_store (MarqoDocumentStore): An instance of a MarqoDocumentStore
             filters (Optional[Dict[str, Any]], optional): A dictionary with filters to narrow down the search space. Defaults to None.
             top_k (int, optional):
+            max_workers (Optional[int], optional): The number of threads used to split a list of queries into concurrent
+                searches, each search still sends its share of the queries in one bulk request. Defaults to None, which
+                sends all queries in a single search.
+            search_params (Optional[Dict[str, Any]], optional): Extra keyword arguments for the Marqo search, for
+                example `search_method`. Defaults to None.
         """
         self.filters = filters
         self.top_k = top_k
         self.document_store = document_store
+        self.max_workers = max_workers
+        self.search_params = search_params
+        # the last filters and their filter string, the filters are kept so their id can't be reused by another dict
+        self._filters_cache: Optional[Tuple[Optional[Dict[str, Any]], Optional[str]]] = None
+
+        self._pool = None
+        if max_workers is not None and max_workers > 1:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="marqo-retriever")
+            # shut the pool down when the retriever is garbage collected or at the latest when the interpreter exits
+            weakref.finalize(self, self._pool.shutdown, wait=False)
 
     @component.output_types(documents=List[List[Document]])
-    def run(self, queries: List[str], filters: Optional[Dict[str, Any]] = None, top_k: Optional[int] = None):
+    def run(
+        self,
+        queries: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ):
         """Run the retriever on the given list of queries.
 
         Args:
             queries (List[str]): An input list of queries
             filters (Optional[Dict[str, Any]], optional): A dictionary with filters to narrow down the search space. Defaults to None.
             top_k (Optional[int], optional): The maximum number of documents to retrieve. Defaults to None.
+            search_params (Optional[Dict[str, Any]], optional): Extra keyword arguments for the Marqo search. Defaults
+                to None.
+        """
+
+        top_k = self.top_k if top_k is None else top_k
+        filters = self.filters if filters is None else filters
+        search_params = self.search_params if search_params is None else search_params
+
+        # search every distinct query once and hand the results back out in the order of the queries
+        unique_queries, positions = _deduplicate(queries)
+        documents = self._search(unique_queries, top_k, filters, search_params)
+        if len(unique_queries) < len(queries):
+            # duplicates get their own list so changing one result doesn't change another
+            documents = [list(documents[i]) for i in positions]
+
+        return {"documents": documents}
+
+    def _search(
+        self,
+        queries: List[str],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Document]]:
+        filter_string = self._filter_string(filters)
+        search = partial(
+            self.document_store._search_filter_string,
+            top_k=top_k,
+            filter_string=filter_string,
+            search_params=search_params,
+        )
+        if self._pool is None or len(queries) <= 1:
+            return search(queries)
+
+        slice_size = -(-len(queries) // self.max_workers)
+        query_slices = [queries[i : i + slice_size] for i in range(0, len(queries), slice_size)]
+        return [documents for result in self._pool.map(search, query_slices) for documents in result]
+
+    def _filter_string(self, filters: Optional[Dict[str, Any]]) -> Optional[str]:
+        """
+        Convert filters to a Marqo filter string, reusing the last conversion when the same filters object is passed
+        again, as with the retriever's default filters. Filters are not expected to change after they are passed.
+        """
+        filters_cache = self._filters_cache
+        if filters_cache is not None and filters_cache[0] is filters:
+            return filters_cache[1]
+        filter_string = self.document_store._convert_filters(filters)
+        self._filters_cache = (filters, filter_string)
+        return filter_string
+
+    async def run_async(
+        self,
+        queries: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+        max_inflight: int = 16,
+    ):
+        """Run the retriever on the given list of queries from an event loop, searching every query on its own.
+
+        Args:
+            queries (List[str]): An input list of queries
+            filters (Optional[Dict[str, Any]], optional): A dictionary with filters to narrow down the search space. Defaults to None.
+            top_k (Optional[int], optional): The maximum number of documents to retrieve. Defaults to None.
+            search_params (Optional[Dict[str, Any]], optional): Extra keyword arguments for the Marqo search. Defaults
+                to None.
+            max_inflight (int, optional): The maximum number of searches sent to Marqo at the same time. Defaults to 16.
+
+        Raises:
+            ValueError: If max_inflight is lower than 1.
         """
+        if max_inflight < 1:
+            msg = f"max_inflight must be at least 1, got {max_inflight}"
+            raise ValueError(msg)
+
+        top_k = self.top_k if top_k is None else top_k
+        filters = self.filters if filters is None else filters
+        search_params = self.search_params if search_params is None else search_params
 
-        if not top_k:
-            top_k = self.top_k
+        filter_string = self._filter_string(filters)
+        semaphore = asyncio.Semaphore(max_inflight)
 
-        if not filters:
-            filters = self.filters
+        # every distinct query is searched once and its documents are written to the slots of all its occurrences
+        unique_queries, positions = _deduplicate(queries)
+        query_slots: List[List[int]] = [[] for _ in unique_queries]
+        for i, position in enumerate(positions):
+            query_slots[position].append(i)
+        documents: List[Optional[List[Document]]] = [None] * len(queries)
 
-        return {"documents": self.document_store.search(queries, top_k, filters=filters)}
+        async def search_one(query: str, slots: List[int]) -> None:
+            async with semaphore:
+                # the store is synchronous, so each search waits on its HTTP request in a worker thread
+                result = await asyncio.to_thread(
+                    self.document_store._search_filter_string, [query], top_k, filter_string, search_params
+                )
+            documents[slots[0]] = result[0]
+            # duplicates get their own list so changing one result doesn't change another
+            for i in slots[1:]:
+                documents[i] = list(result[0])
+
+        await asyncio.gather(*(search_one(query, slots) for query, slots in zip(unique_queries, query_slots)))
+        return {"documents": documents}
 
 
 @component
 class MarqoSingleRetriever(MarqoRetriever):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @component.output_types(documents=List[Document])
-    def run(self, query: str, filters: Optional[Dict[str, Any]] = None, top_k: Optional[int] = None):
+    def run(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ):
         """Run the retriever on a single query.
 
         Args:
             query (str): An input query
             filters (Optional[Dict[str, Any]], optional): A dictionary with filters to narrow down the search space. Defaults to None.
             top_k (Optional[int], optional): The maximum number of documents to retrieve. Defaults to None.
+            search_params (Optional[Dict[str, Any]], optional): Extra keyword arguments for the Marqo search. Defaults
+                to None.
         """
-        return {"documents": super().run([query], filters, top_k)["documents"][0]}
+        top_k = self.top_k if top_k is None else top_k
+        filters = self.filters if filters is None else filters
+        search_params = self.search_params if search_params is None else search_params
+
+        return {"documents": self.document_store._search_one(query, top_k, self._filter_string(filters), search_params)}
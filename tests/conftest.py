@@ -0,0 +1,37 @@
+import pytest
+
+# tests of DocumentStoreBaseTests covering features Marqo does not support, mapped to the reason they are skipped
+_UNSUPPORTED = {
+    "test_eq_filter_embedding": "Filter on embedding value is not supported.",
+    "test_in_filter_embedding": "Filter on embedding value is not supported.",
+    "test_ne_filter_embedding": "Filter on embedding value is not supported.",
+    "test_nin_filter_embedding": "Filter on embedding value is not supported.",
+    "test_gt_filter_embedding": "Filter on embedding value is not supported.",
+    "test_gte_filter_embedding": "Filter on embedding value is not supported.",
+    "test_lt_filter_embedding": "Filter on embedding value is not supported.",
+    "test_lte_filter_embedding": "Filter on embedding value is not supported.",
+    "test_eq_filter_table": "Filter on table value is not supported.",
+    "test_in_filter_table": "Filter on table value is not supported.",
+    "test_ne_filter_table": "Filter on table value is not supported.",
+    "test_nin_filter_table": "Filter on table value is not supported.",
+    "test_gt_filter_table": "Filter on table value is not supported.",
+    "test_gte_filter_table": "Filter on table value is not supported.",
+    "test_lt_filter_table": "Filter on table value is not supported.",
+    "test_lte_filter_table": "Filter on table value is not supported.",
+    "test_gt_filter_non_numeric": "Range query on non-numeric value is not supported.",
+    "test_gte_filter_non_numeric": "Range query on non-numeric value is not supported.",
+    "test_lt_filter_non_numeric": "Range query on non-numeric value is not supported.",
+    "test_lte_filter_non_numeric": "Range query on non-numeric value is not supported.",
+    "test_write_duplicate_fail": "Duplicate policy not supported.",
+    "test_write_duplicate_skip": "Duplicate policy not supported.",
+    "test_write_duplicate_overwrite": "Duplicate policy not supported.",
+    "test_filter_document_array": "Filter on array contents is not supported.",
+    "test_filter_document_dataframe": "Filter on dataframe is not supported.",
+}
+
+
+def pytest_collection_modifyitems(items):
+    for item in items:
+        reason = _UNSUPPORTED.get(item.originalname)
+        if reason is not None:
+            item.add_marker(pytest.mark.skip(reason=reason))
@@ -1,12 +1,14 @@
-from typing import List
-from haystack.preview.dataclasses import Document
-from haystack.preview.document_stores import DocumentStore
+from typing import Iterator
 
+import marqo
+import numpy as np
 import pytest
 from haystack.preview import Document
 from haystack.preview.testing.document_store import DocumentStoreBaseTests
+from marqo.errors import MarqoCloudIndexNotFoundError, MarqoWebError
 
-from marqo_haystack.document_store import MarqoDocumentStore
+from marqo_haystack.document_store import MarqoDocumentStore, _LRUCache
+from marqo_haystack.errors import MarqoDocumentStoreFilterError
 
 
 class TestDocumentStore(DocumentStoreBaseTests):
@@ -15,18 +17,33 @@ class TestDocumentStore(DocumentStoreBaseTests):
     you can add more to this class.
     """
 
+    @pytest.fixture(scope="session")
+    def shared_docstore(self, request) -> Iterator[MarqoDocumentStore]:
+        """
+        Creating a Marqo index is slow, so every test session (one per pytest-xdist worker) creates its own index once
+        and deletes it at the end.
+        """
+        mq = marqo.Client()
+        worker_id = getattr(request.config, "workerinput", {}).get("workerid", "main")
+        test_index = f"test-haystack-document-store-{worker_id}"
+        try:
+            mq.delete_index(test_index)
+        except MarqoWebError:
+            pass
+        yield MarqoDocumentStore(collection_name=test_index)
+        mq.delete_index(test_index)
+
     @pytest.fixture
-    def docstore(self) -> MarqoDocumentStore:
+    def docstore(self, shared_docstore: MarqoDocumentStore) -> MarqoDocumentStore:
         """
         This is the most basic requirement for the child class: provide
         an instance of this document store so the base class can use it.
+        The shared index is emptied so every test starts without documents.
         """
-        import marqo
-
-        mq = marqo.Client()
-        test_index = "test-haystack-document-store"
-        mq.delete_index(test_index)
-        return MarqoDocumentStore(collection_name=test_index)
+        ids = [doc.id for doc in shared_docstore.filter_documents()]
+        if ids:
+            shared_docstore.delete_documents(ids)
+        return shared_docstore
 
     @pytest.mark.unit
     def test_delete_empty(self, docstore: MarqoDocumentStore):
@@ -83,127 +100,130 @@ class TestDocumentStore(DocumentStoreBaseTests):
         assert len(documents[1]) <= 10
         docstore.delete_documents([doc.id])
 
-    @pytest.mark.skip(reason="Filter on embedding value is not supported.")
     @pytest.mark.unit
-    def test_eq_filter_embedding(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
-
-    @pytest.mark.skip(reason="Filter on embedding value is not supported.")
-    @pytest.mark.unit
-    def test_in_filter_embedding(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
-
-    @pytest.mark.skip(reason="Filter on embedding value is not supported.")
-    @pytest.mark.unit
-    def test_ne_filter_embedding(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
-
-    @pytest.mark.skip(reason="Filter on embedding value is not supported.")
-    @pytest.mark.unit
-    def test_nin_filter_embedding(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
-
-    @pytest.mark.skip(reason="Filter on embedding value is not supported.")
-    @pytest.mark.unit
-    def test_gt_filter_embedding(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
-
-    @pytest.mark.skip(reason="Filter on embedding value is not supported.")
-    @pytest.mark.unit
-    def test_gte_filter_embedding(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_search_rejects_reserved_params(self, docstore: MarqoDocumentStore):
+        """
+        Search parameters the document store sets itself or Marqo doesn't accept are refused
+        """
+        with pytest.raises(ValueError):
+            docstore.search(queries=["test1"], top_k=10, search_params={"limit": 3})
+        with pytest.raises(ValueError):
+            docstore.search(queries=["test1"], top_k=10, search_params={"not_a_search_param": 1})
+        assert docstore.search(queries=["test1"], top_k=10, search_params={"search_method": "TENSOR"}) == [[]]
 
-    @pytest.mark.skip(reason="Filter on embedding value is not supported.")
     @pytest.mark.unit
-    def test_lt_filter_embedding(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_search_cache_cleared_on_write(self, docstore: MarqoDocumentStore, monkeypatch):
+        """
+        Cached search results must not hide documents written afterwards
+        """
+        monkeypatch.setattr(docstore, "_query_cache", _LRUCache(16, ttl=300))
+        assert docstore.search(queries=["test1"], top_k=10) == [[]]
 
-    @pytest.mark.skip(reason="Filter on embedding value is not supported.")
-    @pytest.mark.unit
-    def test_lte_filter_embedding(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+        doc = Document(id="mydoc", text="test1 test2")
+        docstore.write_documents([doc])
 
-    @pytest.mark.skip(reason="Filter on table value is not supported.")
-    @pytest.mark.unit
-    def test_eq_filter_table(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+        documents = docstore.search(queries=["test1"], top_k=10)
+        assert [d.id for d in documents[0]] == [doc.id]
+        docstore.delete_documents([doc.id])
 
-    @pytest.mark.skip(reason="Filter on table value is not supported.")
     @pytest.mark.unit
-    def test_in_filter_table(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_embedding_round_trip(self, docstore: MarqoDocumentStore, monkeypatch):
+        """
+        Embeddings are packed when written and unpacked when read back
+        """
+        monkeypatch.setattr(docstore, "pack_embeddings", True)
+        embedding = np.random.rand(768).astype(np.float32)
+        doc = Document(text="test doc", embedding=embedding)
+        docstore.write_documents([doc])
 
-    @pytest.mark.skip(reason="Filter on table value is not supported.")
-    @pytest.mark.unit
-    def test_ne_filter_table(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+        gotten_doc = docstore.get_documents_by_id(ids=[doc.id])[0]
+        assert np.array_equal(gotten_doc.embedding, embedding)
+        docstore.delete_documents([doc.id])
 
-    @pytest.mark.skip(reason="Filter on table value is not supported.")
     @pytest.mark.unit
-    def test_nin_filter_table(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_non_ascii_text(self, docstore: MarqoDocumentStore):
+        """
+        Non-ASCII text is written, read back and searched unchanged
+        """
+        doc = Document(text="café 東京 🚀", metadata={"city": "Zürich"})
+        docstore.write_documents([doc])
 
-    @pytest.mark.skip(reason="Filter on table value is not supported.")
-    @pytest.mark.unit
-    def test_gt_filter_table(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+        gotten_doc = docstore.get_documents_by_id(ids=[doc.id])[0]
+        assert gotten_doc.text == doc.text
+        assert gotten_doc.metadata == {"city": "Zürich"}
 
-    @pytest.mark.skip(reason="Filter on table value is not supported.")
-    @pytest.mark.unit
-    def test_gte_filter_table(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+        documents = docstore.search(queries=["café", "東京 🚀"], top_k=10)
+        assert [d.id for d in documents[0]] == [doc.id]
+        assert [d.id for d in documents[1]] == [doc.id]
+        docstore.delete_documents([doc.id])
 
-    @pytest.mark.skip(reason="Filter on table value is not supported.")
     @pytest.mark.unit
-    def test_lt_filter_table(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_missing_index_with_api_key(self, docstore: MarqoDocumentStore, monkeypatch):
+        """
+        With an API key the index must exist, when the cloud client can't find the index the indexes are listed
+        """
+        with pytest.raises(ValueError):
+            MarqoDocumentStore(collection_name="test-haystack-missing-index", api_key="test-key")
 
-    @pytest.mark.skip(reason="Filter on table value is not supported.")
-    @pytest.mark.unit
-    def test_lte_filter_table(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+        def get_stats(index):
+            raise MarqoCloudIndexNotFoundError(index.index_name)
 
-    @pytest.mark.skip(reason="Range query on non-numeric value is not supported.")
-    @pytest.mark.unit
-    def test_gt_filter_non_numeric(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+        monkeypatch.setattr(marqo.index.Index, "get_stats", get_stats)
+        assert docstore._index_exists()
+        monkeypatch.setattr(docstore, "_collection", "test-haystack-missing-index")
+        assert not docstore._index_exists()
 
-    @pytest.mark.skip(reason="Range query on non-numeric value is not supported.")
     @pytest.mark.unit
-    def test_gte_filter_non_numeric(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_embedding_not_stored_by_default(self, docstore: MarqoDocumentStore):
+        """
+        Embeddings are only stored when packing them is enabled
+        """
+        doc = Document(text="test doc", embedding=np.random.rand(768).astype(np.float32))
+        docstore.write_documents([doc])
 
-    @pytest.mark.skip(reason="Range query on non-numeric value is not supported.")
-    @pytest.mark.unit
-    def test_lt_filter_non_numeric(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+        assert docstore.get_documents_by_id(ids=[doc.id])[0].embedding is None
+        docstore.delete_documents([doc.id])
 
-    @pytest.mark.skip(reason="Range query on non-numeric value is not supported.")
     @pytest.mark.unit
-    def test_lte_filter_non_numeric(self, docstore: MarqoDocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_get_many_keeps_order(self, docstore: MarqoDocumentStore):
+        """
+        Getting more documents than fit in one request keeps the order of the ids
+        """
+        docs = [Document(text=f"test doc {i}") for i in range(300)]
+        docstore.write_documents(docs)
 
-    @pytest.mark.skip(reason="Duplicate policy not supported.")
-    @pytest.mark.unit
-    def test_write_duplicate_fail(self, docstore: MarqoDocumentStore):
-        pass
+        ids = [doc.id for doc in reversed(docs)]
+        assert [doc.id for doc in docstore.get_documents_by_id(ids=ids)] == ids
+        docstore.delete_documents(ids)
 
-    @pytest.mark.skip(reason="Duplicate policy not supported.")
     @pytest.mark.unit
-    def test_write_duplicate_skip(self, docstore: MarqoDocumentStore):
-        pass
+    def test_convert_filters_keeps_input(self, docstore: MarqoDocumentStore):
+        """
+        Converting filters must not modify the caller's filters
+        """
+        filters = {"number": {"$and": [{"$lte": 2}, {"$gte": 0}]}}
+        filter_string = docstore._convert_filters(filters)
 
-    @pytest.mark.skip(reason="Duplicate policy not supported.")
-    @pytest.mark.unit
-    def test_write_duplicate_overwrite(self, docstore: MarqoDocumentStore):
-        pass
+        assert filter_string == "(__metadata_number:[* TO 2] AND __metadata_number:[0 TO *])"
+        assert filters == {"number": {"$and": [{"$lte": 2}, {"$gte": 0}]}}
 
-    @pytest.mark.skip(reason="Filter on array contents is not supported.")
     @pytest.mark.unit
-    def test_filter_document_array(self, docstore: DocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_convert_filters_same_structure(self, docstore: MarqoDocumentStore):
+        """
+        Filters sharing a structure are converted with their own values
+        """
+        assert docstore._convert_filters({"name": "a", "number": {"$gte": 1}}) == (
+            "__metadata_name:(a) AND __metadata_number:[1 TO *]"
+        )
+        assert docstore._convert_filters({"name": "b", "number": {"$gte": 2.5}}) == (
+            "__metadata_name:(b) AND __metadata_number:[2.5 TO *]"
+        )
+        with pytest.raises(MarqoDocumentStoreFilterError):
+            docstore._convert_filters({"name": "c", "number": {"$gte": "3"}})
 
-    @pytest.mark.skip(reason="Filter on dataframe is not supported.")
     @pytest.mark.unit
-    def test_filter_document_dataframe(self, docstore: DocumentStore, filterable_docs: List[Document]):
-        pass
+    def test_convert_filters_single_element_list(self, docstore: MarqoDocumentStore):
+        """
+        A list holding a single filter converts like the filter itself
+        """
+        assert docstore._convert_filters([{"name": "a"}]) == "__metadata_name:(a)"
@@ -0,0 +1,131 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import pytest
+from haystack.preview import Document
+
+from marqo_haystack.retriever import MarqoRetriever, MarqoSingleRetriever, _deduplicate
+
+
+class StubDocumentStore:
+    """
+    Stands in for a MarqoDocumentStore, returning one document per query and recording the searches.
+    """
+
+    def __init__(self):
+        self.converted: List[Optional[Dict[str, Any]]] = []
+        self.searches: List[List[Any]] = []
+
+    def _convert_filters(self, filters: Optional[Dict[str, Any]]) -> Optional[str]:
+        self.converted.append(filters)
+        return None if filters is None else str(sorted(filters.items()))
+
+    def _search_filter_string(
+        self,
+        queries: List[Any],
+        top_k: int,
+        filter_string: Optional[str],
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Document]]:
+        self.searches.append(list(queries))
+        return [[Document(id=f"{query}-{top_k}", text=str(query))] for query in queries]
+
+    def _search_one(
+        self,
+        query: Any,
+        top_k: int,
+        filter_string: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        return self._search_filter_string([query], top_k, filter_string, search_params)[0]
+
+
+def _ids(documents: List[List[Document]]) -> List[List[str]]:
+    return [[document.id for document in result] for result in documents]
+
+
+class TestRetriever:
+    @pytest.mark.unit
+    def test_deduplicate(self):
+        """
+        Text queries are deduplicated in order of first occurrence, weighted queries are always kept
+        """
+        queries = ["a", "b", "a", {"w": 1.0}, {"w": 1.0}, "b"]
+        assert _deduplicate(queries) == (["a", "b", {"w": 1.0}, {"w": 1.0}], [0, 1, 0, 2, 3, 1])
+
+    @pytest.mark.unit
+    def test_run_searches_duplicates_once(self):
+        """
+        Repeated queries are searched once and every occurrence gets its own copy of the documents
+        """
+        store = StubDocumentStore()
+        documents = MarqoRetriever(store, top_k=3).run(["a", "b", "a", "b"])["documents"]
+
+        assert store.searches == [["a", "b"]]
+        assert _ids(documents) == [["a-3"], ["b-3"], ["a-3"], ["b-3"]]
+        assert documents[0] is not documents[2]
+        documents[0].clear()
+        assert _ids(documents)[2] == ["a-3"]
+
+    @pytest.mark.unit
+    def test_run_pool_keeps_order(self):
+        """
+        With a pool the queries are split into consecutive slices whose results are joined in query order
+        """
+        store = StubDocumentStore()
+        queries = [f"q{i}" for i in range(7)]
+        documents = MarqoRetriever(store, max_workers=3).run([*queries, "q0"])["documents"]
+
+        assert sorted(store.searches) == [["q0", "q1", "q2"], ["q3", "q4", "q5"], ["q6"]]
+        assert _ids(documents) == [[f"{query}-10"] for query in [*queries, "q0"]]
+
+    @pytest.mark.unit
+    def test_run_async_fills_slots(self):
+        """
+        run_async searches every distinct query once and writes its documents to all of its positions
+        """
+        store = StubDocumentStore()
+        queries = ["a", "b", "a", {"w": 1.0}, "b"]
+        documents = asyncio.run(MarqoRetriever(store).run_async(queries, max_inflight=2))["documents"]
+
+        assert sorted(map(str, store.searches)) == sorted(map(str, [["a"], ["b"], [{"w": 1.0}]]))
+        assert _ids(documents) == [["a-10"], ["b-10"], ["a-10"], ["{'w': 1.0}-10"], ["b-10"]]
+        assert documents[0] is not documents[2]
+        assert asyncio.run(MarqoRetriever(store).run_async([]))["documents"] == []
+
+    @pytest.mark.unit
+    def test_filter_string_reused_for_same_filters(self):
+        """
+        The filters are converted again only when a different filters object is passed
+        """
+        store = StubDocumentStore()
+        filters = {"a": 1}
+        marqo_retriever = MarqoSingleRetriever(store, filters=filters)
+        for _ in range(3):
+            marqo_retriever.run("q")
+        marqo_retriever.run("q", filters={"a": 1})
+        marqo_retriever.run("q")
+        asyncio.run(marqo_retriever.run_async(["q", "r"]))
+
+        assert store.converted == [filters, {"a": 1}, filters]
+
+    @pytest.mark.unit
+    def test_defaults_only_replace_none(self):
+        """
+        top_k and filters fall back to the retriever's current values only when they are None
+        """
+        store = StubDocumentStore()
+        marqo_retriever = MarqoRetriever(store, filters={"a": 1}, top_k=2)
+        marqo_retriever.top_k = 5
+
+        assert marqo_retriever.run(["q"])["documents"] == [[Document(id="q-5", text="q")]]
+        assert marqo_retriever.run(["q"], top_k=0, filters={})["documents"] == [[Document(id="q-0", text="q")]]
+        assert store.converted == [{"a": 1}, {}]
+
+    @pytest.mark.unit
+    def test_run_async_max_inflight(self):
+        """
+        run_async refuses a limit that would never let a search start
+        """
+        with pytest.raises(ValueError):
+            asyncio.run(MarqoRetriever(StubDocumentStore()).run_async(["q"], max_inflight=0))